@@ -0,0 +1,55 @@
+"""
+Memory benchmark for the in-memory submission records.
+
+Builds the revisit working set once as plain dicts and once as SubmissionRecord objects and reports the memory
+allocated by each of them.
+
+Usage: python benchmark_records.py [record count]
+"""
+import sys
+import tracemalloc
+from typing import Callable, List
+
+from models import SubmissionRecord, SubmissionState
+
+DEFAULT_RECORD_COUNT = 1_000_000
+BASE_TIMESTAMP = 1_640_000_000
+
+
+def build_dicts(count: int) -> List[dict]:
+    return [{
+        'submission_id': f'r{i:06x}',
+        'subreddit': f'sub{i % 50_000}',
+        'created_at': BASE_TIMESTAMP + i,
+        'updated_at': BASE_TIMESTAMP + i,
+        'status': SubmissionState(i % len(SubmissionState)),
+    } for i in range(count)]
+
+
+def build_records(count: int) -> List[SubmissionRecord]:
+    return [SubmissionRecord(f'r{i:06x}',
+                             f'sub{i % 50_000}',
+                             BASE_TIMESTAMP + i,
+                             BASE_TIMESTAMP + i,
+                             i % len(SubmissionState)) for i in range(count)]
+
+
+def measure(builder: Callable[[int], list], count: int) -> int:
+    tracemalloc.start()
+    working_set = builder(count)
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del working_set
+    return allocated
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_RECORD_COUNT
+    print(f'Working set of {count} submissions:')
+    for name, builder in (('dict', build_dicts), ('SubmissionRecord', build_records)):
+        allocated = measure(builder, count)
+        print(f'    {name:<16}  {allocated / 2 ** 20:8.1f} MiB  {allocated / count:6.1f} B/record')
+
+
+if __name__ == '__main__':
+    main()
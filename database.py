@@ -1,25 +1,44 @@
-from typing import List, Generator, Dict
+from __future__ import annotations
+
+import asyncio
+from typing import List, Generator, Dict, Iterable, Optional, Tuple, TYPE_CHECKING
 import sqlite3
 from sqlite3 import Connection
 from datetime import datetime
 from os import path
 
-from asyncpraw.reddit import Submission, Redditor
-from discord import Message, TextChannel
-from discord.ext.commands import Bot
+from models import SubmissionState, SubredditState, SubmissionRecord, MessageRecord, RedditorRecord, \
+    DailyStatisticsRecord, SubredditStatisticsRecord
 
-from models import SubmissionState
+if TYPE_CHECKING:
+    from asyncpraw.reddit import Submission, Redditor
+    from discord import Message, TextChannel
+    from discord.ext.commands import Bot
 
 
 class Database:
     def __init__(self, database_name: str):
         self.database_name: str = database_name
-        self.__check_database_name()
-        db_path = path.join(path.dirname(__file__), self.database_name)
+        if self.database_name == ':memory:':
+            db_path = self.database_name
+        else:
+            self.__check_database_name()
+            db_path = path.join(path.dirname(__file__), self.database_name)
 
-        self.connection: Connection = sqlite3.connect(db_path)
+        # open() sets the database up on a worker thread, afterwards the connection is only used from the event loop
+        self.connection: Connection = sqlite3.connect(db_path, check_same_thread=False)
 
         self.__setup_database()
+        self.__enable_incremental_vacuum()
+
+    @classmethod
+    async def open(cls, database_name: str) -> Database:
+        """Opens the database on a worker thread, so the event loop can keep connecting to Discord meanwhile"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, cls, database_name)
+
+    def close(self) -> None:
+        self.connection.close()
 
     def __check_database_name(self) -> None:
         """This method makes sure the database name is somewhat adequate"""
@@ -31,6 +50,8 @@ class Database:
         """This method initializes the database, adding all necessary tabes"""
 
         cursor = self.connection.cursor()
+        # Only takes effect on new databases, existing ones are converted by __enable_incremental_vacuum()
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
         create_table_posts = "CREATE TABLE IF NOT EXISTS submissions(" \
                              "id INTEGER PRIMARY KEY AUTOINCREMENT," \
                              "submission_id TEXT UNIQUE," \
@@ -56,19 +77,184 @@ class Database:
                                 "updated_at INTEGER" \
                                 ")"
         cursor.execute(create_table_messages)
+        create_table_archive = "CREATE TABLE IF NOT EXISTS submissions_archive_daily(" \
+                               "day INTEGER, " \
+                               "status INTEGER, " \
+                               "post_count INTEGER DEFAULT 0, " \
+                               "PRIMARY KEY (day, status)" \
+                               ")"
+        cursor.execute(create_table_archive)
+        # Monthly archives from before are carried over onto the first day of their month
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM sqlite_master WHERE type == 'table' AND name == 'submissions_archive')")
+        if cursor.fetchone()[0]:
+            cursor.execute("INSERT INTO submissions_archive_daily(day, status, post_count) "
+                           "SELECT month, status, post_count FROM submissions_archive WHERE true "
+                           "ON CONFLICT(day, status) DO UPDATE SET post_count = post_count + excluded.post_count")
+            cursor.execute("DROP TABLE submissions_archive")
+        cursor.execute("CREATE INDEX IF NOT EXISTS submissions_created_at ON submissions(created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS messages_submission_id ON messages(submission_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS messages_channel_id ON messages(channel_id)")
+        self.__setup_statistics(cursor)
         self.connection.commit()
 
+    def __setup_statistics(self, cursor: sqlite3.Cursor) -> None:
+        """This method adds the event log and the rollup tables, which are maintained along with the submissions"""
+        create_table_submission_events = "CREATE TABLE IF NOT EXISTS submission_events(" \
+                                         "id INTEGER PRIMARY KEY AUTOINCREMENT," \
+                                         "submission_id TEXT, " \
+                                         "subreddit TEXT, " \
+                                         "from_status INTEGER, " \
+                                         "to_status INTEGER, " \
+                                         "occurred_at INTEGER" \
+                                         ")"
+        cursor.execute(create_table_submission_events)
+        cursor.execute("CREATE INDEX IF NOT EXISTS submission_events_submission_id "
+                       "ON submission_events(submission_id)")
+        create_table_subreddit_events = "CREATE TABLE IF NOT EXISTS subreddit_events(" \
+                                        "id INTEGER PRIMARY KEY AUTOINCREMENT," \
+                                        "subreddit TEXT COLLATE NOCASE, " \
+                                        "from_state INTEGER, " \
+                                        "to_state INTEGER, " \
+                                        "occurred_at INTEGER" \
+                                        ")"
+        cursor.execute(create_table_subreddit_events)
+        cursor.execute("CREATE INDEX IF NOT EXISTS subreddit_events_subreddit "
+                       "ON subreddit_events(subreddit, occurred_at)")
+        create_table_daily = "CREATE TABLE IF NOT EXISTS daily_statistics(" \
+                             "day INTEGER PRIMARY KEY, " \
+                             "submitted INTEGER DEFAULT 0, " \
+                             "granted INTEGER DEFAULT 0, " \
+                             "denied INTEGER DEFAULT 0, " \
+                             "decided INTEGER DEFAULT 0, " \
+                             "decision_seconds INTEGER DEFAULT 0" \
+                             ")"
+        cursor.execute(create_table_daily)
+        create_table_subreddit = "CREATE TABLE IF NOT EXISTS subreddit_statistics(" \
+                                 "subreddit TEXT PRIMARY KEY COLLATE NOCASE, " \
+                                 "request_count INTEGER DEFAULT 0, " \
+                                 "granted INTEGER DEFAULT 0, " \
+                                 "denied INTEGER DEFAULT 0, " \
+                                 "state INTEGER, " \
+                                 "state_changed_at INTEGER" \
+                                 ")"
+        cursor.execute(create_table_subreddit)
+        cursor.execute("CREATE INDEX IF NOT EXISTS subreddit_statistics_request_count "
+                       "ON subreddit_statistics(request_count)")
+
+        # Databases from before the rollups existed get them computed once from the submissions they still hold
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM daily_statistics) OR EXISTS (SELECT 1 FROM subreddit_statistics)")
+        if cursor.fetchone()[0]:
+            return
+        # Decided submissions count towards the day they were created on, when they were decided isn't known
+        backfill_daily_stmt = "INSERT INTO daily_statistics(day, submitted, granted, denied) " \
+                              "SELECT created_at - created_at % 86400, COUNT(*), SUM(status == ?), SUM(status == ?) " \
+                              "FROM submissions GROUP BY 1"
+        decisions = (SubmissionState.GRANTED.value, SubmissionState.DENIED.value)
+        cursor.execute(backfill_daily_stmt, decisions)
+        backfill_subreddit_stmt = "INSERT INTO subreddit_statistics(subreddit, request_count, granted, denied) " \
+                                  "SELECT subreddit, COUNT(*), SUM(status == ?), SUM(status == ?) " \
+                                  "FROM submissions GROUP BY subreddit COLLATE NOCASE"
+        cursor.execute(backfill_subreddit_stmt, decisions)
+
+    def __record_status_change(self, cursor: sqlite3.Cursor, submission_id: str, subreddit: str, created_at: int,
+                               posted_at: int, from_status: Optional[SubmissionState], to_status: SubmissionState,
+                               timestamp: int) -> None:
+        """
+        Logs a status change of a submission and updates the rollups. Decisions count towards the day they were made
+        on and are taken back from it when the status changes again.
+
+        The time to decision is measured from when the post was made on Reddit (posted_at) and only for the first
+        decision of a submission. Submissions which were already decided when they were first stored don't have a
+        measured decision, as it is unknown when the decision was made.
+        """
+        decisions = (SubmissionState.GRANTED, SubmissionState.DENIED)
+        day = timestamp - timestamp % 86400
+        if from_status is None:
+            self.__update_daily_statistics(cursor, day, submitted=1)
+            self.__update_subreddit_statistics(cursor, subreddit, request_count=1)
+
+        if from_status in decisions:
+            # Submissions decided before the event log existed were counted on the day they were created on
+            select_stmt = 'SELECT occurred_at FROM submission_events ' \
+                          'WHERE submission_id == ? AND to_status == ? ORDER BY id DESC LIMIT 1'
+            cursor.execute(select_stmt, (submission_id, from_status.value))
+            row = cursor.fetchone()
+            decided_at = created_at if row is None else row[0]
+            self.__update_daily_statistics(cursor,
+                                           decided_at - decided_at % 86400,
+                                           granted=-int(from_status is SubmissionState.GRANTED),
+                                           denied=-int(from_status is SubmissionState.DENIED))
+            self.__update_subreddit_statistics(cursor,
+                                               subreddit,
+                                               granted=-int(from_status is SubmissionState.GRANTED),
+                                               denied=-int(from_status is SubmissionState.DENIED))
+
+        if to_status in decisions:
+            first_decision = from_status is not None and from_status not in decisions
+            if first_decision:
+                select_stmt = 'SELECT EXISTS (SELECT 1 FROM submission_events ' \
+                              'WHERE submission_id == ? AND to_status IN (?, ?))'
+                cursor.execute(select_stmt, (submission_id, ) + tuple(state.value for state in decisions))
+                first_decision = not cursor.fetchone()[0]
+            self.__update_daily_statistics(cursor,
+                                           day,
+                                           granted=int(to_status is SubmissionState.GRANTED),
+                                           denied=int(to_status is SubmissionState.DENIED),
+                                           decided=int(first_decision),
+                                           decision_seconds=(timestamp - posted_at) * int(first_decision))
+            self.__update_subreddit_statistics(cursor,
+                                               subreddit,
+                                               granted=int(to_status is SubmissionState.GRANTED),
+                                               denied=int(to_status is SubmissionState.DENIED))
+
+        event_stmt = 'INSERT INTO submission_events(submission_id, subreddit, from_status, to_status, occurred_at) ' \
+                     'VALUES (?, ?, ?, ?, ?)'
+        cursor.execute(event_stmt, (submission_id,
+                                    subreddit,
+                                    None if from_status is None else from_status.value,
+                                    to_status.value,
+                                    timestamp))
+
+    @staticmethod
+    def __update_daily_statistics(cursor: sqlite3.Cursor, day: int, submitted: int = 0, granted: int = 0,
+                                  denied: int = 0, decided: int = 0, decision_seconds: int = 0) -> None:
+        daily_stmt = 'INSERT INTO daily_statistics(day, submitted, granted, denied, decided, decision_seconds) ' \
+                     'VALUES (?, ?, ?, ?, ?, ?) ' \
+                     'ON CONFLICT(day) DO UPDATE SET submitted = submitted + excluded.submitted, ' \
+                     'granted = granted + excluded.granted, denied = denied + excluded.denied, ' \
+                     'decided = decided + excluded.decided, ' \
+                     'decision_seconds = decision_seconds + excluded.decision_seconds'
+        cursor.execute(daily_stmt, (day, submitted, granted, denied, decided, decision_seconds))
+
+    @staticmethod
+    def __update_subreddit_statistics(cursor: sqlite3.Cursor, subreddit: str, request_count: int = 0,
+                                      granted: int = 0, denied: int = 0) -> None:
+        subreddit_stmt = 'INSERT INTO subreddit_statistics(subreddit, request_count, granted, denied) ' \
+                         'VALUES (?, ?, ?, ?) ' \
+                         'ON CONFLICT(subreddit) DO UPDATE SET request_count = request_count + excluded.request_count, ' \
+                         'granted = granted + excluded.granted, denied = denied + excluded.denied'
+        cursor.execute(subreddit_stmt, (subreddit, request_count, granted, denied))
+
     async def put_submission(self, submission: Submission, subreddit_name: str, submission_state: SubmissionState)\
             -> None:
         """This method inserts a submission into the database"""
         cursor = self.connection.cursor()
+        timestamp = int(datetime.now().timestamp())
         insert_stmt: str = 'INSERT INTO submissions(submission_id, subreddit, updated_at, created_at, status) ' \
                            'VALUES (?, ?, ?, ?, ?)'
         cursor.execute(insert_stmt, (submission.id,
                                      subreddit_name,
-                                     int(datetime.now().timestamp()),
-                                     int(datetime.now().timestamp()),
+                                     timestamp,
+                                     timestamp,
                                      submission_state.value))
+        self.__record_status_change(cursor,
+                                    submission.id,
+                                    subreddit_name,
+                                    timestamp,
+                                    int(submission.created_utc),
+                                    None,
+                                    submission_state,
+                                    timestamp)
 
         # Handle author aswell
         author = submission.author
@@ -79,30 +265,32 @@ class Database:
 
     async def put_redditor(self, redditor: Redditor) -> None:
         """This method inserts a redditor into the database and increments the count of request if there has already
-        been a previous submission """
-        await redditor.load()
+        been a previous submission, the redditor has to be loaded already """
         if hasattr(redditor, 'is_suspended'):
+            self.connection.commit()
             return
 
         cursor = self.connection.cursor()
-        select_stmt = 'SELECT user_id, request_count FROM redditors WHERE user_id = ?'
-        cursor.execute(select_stmt, (redditor.id, ))
-
-        row_id = -1
-        request_count = 0
-        for usr in cursor:
-            row_id = usr[0]
-            request_count = usr[2]
-
-        if row_id == -1:
+        known_redditor = self.get_redditor(redditor.id)
+        if known_redditor is None:
             insert_stmt = 'INSERT INTO redditors(user_name, user_id, request_count) VALUES (?, ?, ?)'
             cursor.execute(insert_stmt, (redditor.name, redditor.id, 1))
         else:
             update_stmt = 'UPDATE redditors SET request_count = ? WHERE user_id = ?'
-            cursor.execute(update_stmt, (request_count, redditor.id))
+            cursor.execute(update_stmt, (known_redditor.request_count + 1, redditor.id))
 
         self.connection.commit()
 
+    def get_redditor(self, user_id: str) -> Optional[RedditorRecord]:
+        """Returns the stored redditor with the given id or None if there is none"""
+        cursor = self.connection.cursor()
+        select_stmt = 'SELECT user_name, user_id, request_count FROM redditors WHERE user_id = ?'
+        cursor.execute(select_stmt, (user_id, ))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return RedditorRecord(*row)
+
     def put_message(self, message: Message, submission: Submission) -> None:
         """This methods inserts a message into the database"""
         timestamp = int(datetime.now().timestamp())
@@ -144,34 +332,23 @@ class Database:
         cursor.execute(count_stmt, (SubmissionState.GRANTED.value, min_age, max_age, min_age))
         return cursor.fetchone()[0]
 
-    def get_update_submissions(self, min_age: int, max_age: int):
+    def get_update_submissions(self, min_age: int, max_age: int) -> Generator[SubmissionRecord, None, None]:
         cursor = self.connection.cursor()
-        select_stmt = 'SELECT submission_id, subreddit FROM submissions ' \
+        select_stmt = 'SELECT submission_id, subreddit, created_at, updated_at, status FROM submissions ' \
                       'WHERE status != ? AND created_at <= ? AND created_at >= ? AND updated_at <= ? ' \
                       'ORDER BY id'
         cursor.execute(select_stmt, (SubmissionState.GRANTED.value, min_age, max_age, min_age))
         for row in cursor:
-            data = {
-                'submission_id': row[0],
-                'subreddit': row[1]
-            }
-            yield data
-
-    def get_message_ids(self, submission_id: str):
-        """
-        Returns a generator for all message id's for a submission.
-
-        :returns
+            yield SubmissionRecord(*row)
 
-        channel_id: int The id of the channel of a message
-
-        message_id: int The id of the message within a channel
-        """
+    def get_message_records(self, submission_id: str) -> Generator[MessageRecord, None, None]:
+        """Returns a generator for all stored messages of a submission"""
         cursor = self.connection.cursor()
-        select_stmt = 'SELECT * from messages WHERE submission_id == ?'
+        select_stmt = 'SELECT message_id, channel_id, submission_id, created_at, updated_at FROM messages ' \
+                      'WHERE submission_id == ?'
         cursor.execute(select_stmt, (submission_id,))
         for row in cursor:
-            yield row[2], row[1]
+            yield MessageRecord(*row)
 
     def update_message(self, submission_id: str, timestamp: int) -> None:
         cursor = self.connection.cursor()
@@ -179,22 +356,166 @@ class Database:
         cursor.execute(messages_update_stmt, (timestamp, submission_id))
         self.connection.commit()
 
-    def update_post(self, submission_id: str, timestamp: int, status: SubmissionState) -> None:
+    def update_post(self, submission_id: str, timestamp: int, status: SubmissionState, posted_at: int) -> None:
+        """Stores the new status of a submission, posted_at is the creation time of the post on Reddit"""
         cursor = self.connection.cursor()
+        select_stmt = 'SELECT subreddit, created_at, status FROM submissions WHERE submission_id == ?'
+        cursor.execute(select_stmt, (submission_id, ))
+        row = cursor.fetchone()
+        if row is None:
+            return
+        subreddit, created_at, previous_status = row[0], row[1], SubmissionState(row[2])
+
         posts_update_stmt = 'UPDATE submissions SET updated_at = ?, status = ? WHERE submission_id == ?'
-        cursor.execute(posts_update_stmt, (submission_id, timestamp, status.value))
+        cursor.execute(posts_update_stmt, (timestamp, status.value, submission_id))
+        if previous_status is not status:
+            self.__record_status_change(cursor,
+                                        submission_id,
+                                        subreddit,
+                                        created_at,
+                                        posted_at,
+                                        previous_status,
+                                        status,
+                                        timestamp)
         self.connection.commit()
 
+    def update_subreddit_state(self, subreddit: str, state: SubredditState, timestamp: int) -> None:
+        """Stores the current state of a subreddit, changes are added to the subreddit event log"""
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT state FROM subreddit_statistics WHERE subreddit == ?', (subreddit, ))
+        row = cursor.fetchone()
+        previous_state = None if row is None else row[0]
+        if previous_state == state.value:
+            return
+
+        event_stmt = 'INSERT INTO subreddit_events(subreddit, from_state, to_state, occurred_at) VALUES (?, ?, ?, ?)'
+        cursor.execute(event_stmt, (subreddit, previous_state, state.value, timestamp))
+        state_stmt = 'INSERT INTO subreddit_statistics(subreddit, state, state_changed_at) VALUES (?, ?, ?) ' \
+                     'ON CONFLICT(subreddit) DO UPDATE SET state = excluded.state, ' \
+                     'state_changed_at = excluded.state_changed_at'
+        cursor.execute(state_stmt, (subreddit, state.value, timestamp))
+        self.connection.commit()
+
+    def get_daily_statistics(self, since: int) -> List[DailyStatisticsRecord]:
+        """Returns the daily rollups of all days starting from since, ordered by day"""
+        cursor = self.connection.cursor()
+        select_stmt = 'SELECT day, submitted, granted, denied, decided, decision_seconds FROM daily_statistics ' \
+                      'WHERE day >= ? ORDER BY day'
+        cursor.execute(select_stmt, (since - since % 86400, ))
+        return [DailyStatisticsRecord(*row) for row in cursor]
+
+    def get_subreddit_statistics(self, subreddit: str) -> Optional[SubredditStatisticsRecord]:
+        cursor = self.connection.cursor()
+        select_stmt = 'SELECT subreddit, request_count, granted, denied, state, state_changed_at ' \
+                      'FROM subreddit_statistics WHERE subreddit == ?'
+        cursor.execute(select_stmt, (subreddit, ))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return SubredditStatisticsRecord(*row)
+
+    def get_most_requested_subreddits(self, limit: int) -> List[SubredditStatisticsRecord]:
+        cursor = self.connection.cursor()
+        select_stmt = 'SELECT subreddit, request_count, granted, denied, state, state_changed_at ' \
+                      'FROM subreddit_statistics ORDER BY request_count DESC LIMIT ?'
+        cursor.execute(select_stmt, (limit, ))
+        return [SubredditStatisticsRecord(*row) for row in cursor]
+
+    def get_subreddit_events(self, subreddit: str, limit: int) -> List[Tuple[Optional[SubredditState], SubredditState, int]]:
+        """
+        Returns the latest state changes of a subreddit, newest first.
+
+        :returns
+
+        from_state: Optional[SubredditState] The previous state, None for the first recorded state
+
+        to_state: SubredditState The new state
+
+        occurred_at: int The timestamp of the change
+        """
+        cursor = self.connection.cursor()
+        select_stmt = 'SELECT from_state, to_state, occurred_at FROM subreddit_events ' \
+                      'WHERE subreddit == ? ORDER BY occurred_at DESC LIMIT ?'
+        cursor.execute(select_stmt, (subreddit, limit))
+        return [(None if row[0] is None else SubredditState(row[0]), SubredditState(row[1]), row[2])
+                for row in cursor]
+
     def get_post_count(self, max_age: int) -> int:
+        """Counts the posts created since max_age, archived posts are counted for every day overlapping the window"""
         cursor = self.connection.cursor()
-        count_stmt = 'SELECT COUNT(*) FROM submissions ' \
-                     'WHERE created_at >= ? '
-        cursor.execute(count_stmt, (max_age, ))
+        count_stmt = 'SELECT (SELECT COUNT(*) FROM submissions WHERE created_at >= ?) + ' \
+                     '(SELECT IFNULL(SUM(post_count), 0) FROM submissions_archive_daily WHERE day > ?)'
+        cursor.execute(count_stmt, (max_age, max_age - 86400))
         return cursor.fetchone()[0]
 
     def get_post_count_with_status(self, max_age: int, status: SubmissionState) -> int:
+        """Counts the posts with a status created since max_age, archived posts are included like in get_post_count"""
         cursor = self.connection.cursor()
-        count_stmt = 'SELECT COUNT(*) FROM submissions ' \
-                     'WHERE status == ? and created_at >= ? '
-        cursor.execute(count_stmt, (status.value, max_age))
-        return cursor.fetchone()[0]
\ No newline at end of file
+        count_stmt = 'SELECT (SELECT COUNT(*) FROM submissions WHERE status == ? and created_at >= ?) + ' \
+                     '(SELECT IFNULL(SUM(post_count), 0) FROM submissions_archive_daily WHERE status == ? and day > ?)'
+        cursor.execute(count_stmt, (status.value, max_age, status.value, max_age - 86400))
+        return cursor.fetchone()[0]
+
+    def archive_submissions(self, horizon: int) -> int:
+        """
+        Moves all submissions created before horizon into the daily aggregates of submissions_archive_daily and removes
+        their messages and status events. The daily and per-subreddit rollups are kept.
+
+        :returns
+
+        int The number of archived submissions
+        """
+        cursor = self.connection.cursor()
+        archive_stmt = "INSERT INTO submissions_archive_daily(day, status, post_count) " \
+                       "SELECT created_at - created_at % 86400, status, COUNT(*) " \
+                       "FROM submissions WHERE created_at < ? GROUP BY 1, 2 " \
+                       "ON CONFLICT(day, status) DO UPDATE SET post_count = post_count + excluded.post_count"
+        cursor.execute(archive_stmt, (horizon, ))
+        messages_delete_stmt = 'DELETE FROM messages WHERE submission_id IN ' \
+                               '(SELECT submission_id FROM submissions WHERE created_at < ?)'
+        cursor.execute(messages_delete_stmt, (horizon, ))
+        events_delete_stmt = 'DELETE FROM submission_events WHERE submission_id IN ' \
+                             '(SELECT submission_id FROM submissions WHERE created_at < ?)'
+        cursor.execute(events_delete_stmt, (horizon, ))
+        cursor.execute('DELETE FROM submissions WHERE created_at < ?', (horizon, ))
+        archived = cursor.rowcount
+        self.connection.commit()
+        return archived
+
+    def get_message_channel_ids(self) -> List[int]:
+        """Returns the ids of all channels messages have been stored for"""
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT DISTINCT channel_id FROM messages')
+        return [row[0] for row in cursor]
+
+    def delete_channel_messages(self, channel_ids: Iterable[int]) -> int:
+        """Removes all messages of the given channels, returns the number of removed messages"""
+        cursor = self.connection.cursor()
+        cursor.executemany('DELETE FROM messages WHERE channel_id == ?', [(channel_id, ) for channel_id in channel_ids])
+        deleted = cursor.rowcount
+        self.connection.commit()
+        return deleted
+
+    def uses_incremental_vacuum(self) -> bool:
+        cursor = self.connection.cursor()
+        cursor.execute('PRAGMA auto_vacuum')
+        return cursor.fetchone()[0] == 2
+
+    def __enable_incremental_vacuum(self) -> None:
+        """
+        Converts a database created without incremental auto vacuum with a one-time full VACUUM. This runs while the
+        database is set up, before any task uses the connection, as it blocks the connection for the whole VACUUM.
+        """
+        if self.uses_incremental_vacuum():
+            return
+        cursor = self.connection.cursor()
+        cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        cursor.execute('VACUUM')
+
+    def vacuum(self, pages: int) -> None:
+        """Releases up to pages free pages and refreshes the query planner statistics"""
+        cursor = self.connection.cursor()
+        # The pragma only frees pages while its result rows are being stepped through
+        cursor.execute(f'PRAGMA incremental_vacuum({int(pages)})').fetchall()
+        cursor.execute('ANALYZE')
+        self.connection.commit()
\ No newline at end of file
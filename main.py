@@ -1,55 +1,147 @@
-import os
-
-from colorama import init, Fore, Back, Style
-from discord_components import DiscordComponents, ComponentsBot
-from asyncpraw import Reddit
-
-from database import Database
-from models import Config
-from my_cogs import RedditCog
+import asyncio
+import sys
+from contextlib import contextmanager
+from importlib import import_module
+from time import perf_counter
+from typing import List, Tuple
 
 # global constants
 DB_NAME = "redditrequest.sqlite"
+PROFILE_FLAG = "--profile-startup"
+
+
+class StartupProfiler:
+    """Records how long the individual startup phases take"""
 
-# global variables
-config: Config
-reddit: Reddit
-components_bot: ComponentsBot
-database: Database
+    def __init__(self):
+        self.started_at: float = perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, perf_counter() - start))
+
+    def report(self) -> str:
+        total = perf_counter() - self.started_at
+        width = max((len(name) for name, _ in self.phases), default=0)
+        lines = ['Startup profile:']
+        for name, duration in self.phases:
+            lines.append(f'    {name:<{width}}  {duration * 1000:8.1f} ms')
+        lines.append(f'    {"total":<{width}}  {total * 1000:8.1f} ms')
+        return '\n'.join(lines)
 
 
 def main():
-    startup()
-    global reddit, components_bot, config
+    profile_only = PROFILE_FLAG in sys.argv[1:]
+    profiler = StartupProfiler()
+
+    with profiler.phase('import colorama'):
+        from colorama import init
+    # init colorful console output
+    init()
+
+    with profiler.phase('import discord'):
+        from discord_components import ComponentsBot
 
     # Create bot instance
     components_bot = ComponentsBot(command_prefix='/')
-    components_bot.add_cog(RedditCog(components_bot, reddit, database, config))
-    components_bot.run(os.getenv('DISCORD_TOKEN'))
+    loop = components_bot.loop
+    try:
+        loop.run_until_complete(run(components_bot, profiler, profile_only))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if not components_bot.is_closed():
+            loop.run_until_complete(components_bot.close())
 
 
-def startup():
-    # init colorful console output
-    init()
+async def run(components_bot, profiler: StartupProfiler, profile_only: bool) -> None:
+    from colorama import Fore, Back, Style
+
+    with profiler.phase('load config'):
+        from models import Config
+        config = Config()
 
-    # Get global's
-    global reddit, database, config
-    config = Config()
+    # Log in to Discord while asyncpraw is imported and the database is opened on worker threads
+    login = None
+    if not profile_only:
+        login = asyncio.ensure_future(components_bot.login(config.discord_token))
+
+    reddit, database = await asyncio.gather(startup_reddit(config, profiler),
+                                            startup_database(config, profiler),
+                                            return_exceptions=True)
+    failure = next((result for result in (reddit, database) if isinstance(result, BaseException)), None)
+    if failure is not None:
+        # Clean up whatever was set up successfully before giving up
+        if login is not None:
+            login.cancel()
+        if not isinstance(reddit, BaseException):
+            await reddit.close()
+        if not isinstance(database, BaseException):
+            database.close()
+        raise failure
+
+    with profiler.phase('import cogs'):
+        from my_cogs import RedditCog
+
+    if profile_only:
+        print(profiler.report())
+        await reddit.close()
+        database.close()
+        return
+
+    try:
+        with profiler.phase('discord login'):
+            await login
+    except BaseException:
+        await reddit.close()
+        database.close()
+        raise
+
+    print(f'{Fore.WHITE}{Back.BLACK}> Setting up completed - Starting bot  {Style.RESET_ALL}')
+    components_bot.add_cog(RedditCog(components_bot, reddit, database, config))
+    try:
+        await components_bot.connect()
+    finally:
+        await reddit.close()
+        database.close()
+
+
+async def startup_reddit(config, profiler: StartupProfiler):
+    from colorama import Fore, Back, Style
 
     # setup reddit
     print(f'{Fore.WHITE}{Back.BLACK}> Initializing Reddit API access  {Style.RESET_ALL}')
-    reddit = Reddit(client_id=config.reddit_client_id,
-                    client_secret=config.reddit_secret,
-                    user_agent=config.reddit_user_agent,
-                    username=config.reddit_username,
-                    password=config.reddit_password)
+    with profiler.phase('import asyncpraw'):
+        # The client itself has to be created on the event loop, but the import can run on a worker thread
+        await asyncio.get_running_loop().run_in_executor(None, import_module, 'asyncpraw')
+        from asyncpraw import Reddit
+        from reddit_client import RedditClient
+
+    with profiler.phase('reddit client'):
+        reddit = Reddit(client_id=config.reddit_client_id,
+                        client_secret=config.reddit_secret,
+                        user_agent=config.reddit_user_agent,
+                        username=config.reddit_username,
+                        password=config.reddit_password)
 
     print(f'{Fore.WHITE}{Back.BLACK}> Accessing reddit as: {"read-only" if reddit.read_only else "read-write"}  {Style.RESET_ALL}')
+    return RedditClient(reddit, config)
+
+
+async def startup_database(config, profiler: StartupProfiler):
+    from colorama import Fore, Back, Style
+    from database import Database
 
     # setup sqlite3
     print(f'{Fore.WHITE}{Back.BLACK}> Initializing local database  {Style.RESET_ALL}')
-    database = Database(config.sqlite_path)
-    print(f'{Fore.WHITE}{Back.BLACK}> Setting up completed - Starting bot  {Style.RESET_ALL}')
+    with profiler.phase('open database'):
+        database = await Database.open(config.sqlite_path or DB_NAME)
+    return database
 
 
 if __name__ == '__main__':
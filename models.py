@@ -1,14 +1,20 @@
+from __future__ import annotations
+
 import os
+import sys
 from os import path
 from enum import Enum
+from typing import Optional, TYPE_CHECKING
 
-from asyncpraw.reddit import Subreddit, Submission
-from discord import Message
-from py_dotenv import read_dotenv
+if TYPE_CHECKING:
+    from asyncpraw.reddit import Submission
+    from discord import Message
 
 
 class Config:
     def __init__(self):
+        from py_dotenv import read_dotenv
+
         dotenv_path = path.join(path.dirname(__file__), '.env')
         read_dotenv(dotenv_path)
 
@@ -23,6 +29,12 @@ class Config:
         self.min_post_age = int(os.getenv("MIN_POST_AGE"))
         self.max_post_age = int(os.getenv("MAX_POST_AGE"))
         self.channel_name = os.getenv("CHANNEL_NAME")
+        self.retention_days = int(os.getenv("RETENTION_DAYS", 90))
+        self.maintenance_hour = int(os.getenv("MAINTENANCE_HOUR", 4))
+        self.vacuum_pages = int(os.getenv("VACUUM_PAGES", 2000))
+        self.reddit_requests_per_minute = int(os.getenv("REDDIT_REQUESTS_PER_MINUTE", 60))
+        self.reddit_interactive_reserve = int(os.getenv("REDDIT_INTERACTIVE_RESERVE", 5))
+        self.reddit_max_retries = int(os.getenv("REDDIT_MAX_RETRIES", 4))
 
 
 class SubmissionState(Enum):
@@ -43,9 +55,85 @@ class SubredditState(Enum):
     NOT_REACHABLE = 5
 
 
+class RequestPriority(Enum):
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
 class MessageSubredditItem:
+    __slots__ = ('submission_id', 'submission', 'message_id', 'message')
+
     def __init__(self, submission_id: str, submission: Submission, message_id: int, message: Message):
         self.submission_id: str = submission_id
         self.submission: Submission = submission
         self.message_id: int = message_id
         self.message: Message = message
+
+
+class SubmissionRecord:
+    """
+    Compact in-memory representation of a row of the submissions table.
+
+    The state is kept as its integer value and subreddit names are interned, as many requests share a subreddit.
+    """
+    __slots__ = ('submission_id', 'subreddit', 'created_at', 'updated_at', 'status_value')
+
+    def __init__(self, submission_id: str, subreddit: str, created_at: int, updated_at: int, status_value: int):
+        self.submission_id: str = submission_id
+        self.subreddit: str = sys.intern(subreddit)
+        self.created_at: int = created_at
+        self.updated_at: int = updated_at
+        self.status_value: int = status_value
+
+
+class MessageRecord:
+    """Compact in-memory representation of a row of the messages table"""
+    __slots__ = ('message_id', 'channel_id', 'submission_id', 'created_at', 'updated_at')
+
+    def __init__(self, message_id: int, channel_id: int, submission_id: str, created_at: int, updated_at: int):
+        self.message_id: int = message_id
+        self.channel_id: int = channel_id
+        self.submission_id: str = submission_id
+        self.created_at: int = created_at
+        self.updated_at: int = updated_at
+
+
+class RedditorRecord:
+    """Compact in-memory representation of a row of the redditors table"""
+    __slots__ = ('user_name', 'user_id', 'request_count')
+
+    def __init__(self, user_name: str, user_id: str, request_count: int):
+        self.user_name: str = user_name
+        self.user_id: str = user_id
+        self.request_count: int = request_count
+
+
+class DailyStatisticsRecord:
+    """Row of the daily_statistics rollup, day is the timestamp of the start of the day (UTC)"""
+    __slots__ = ('day', 'submitted', 'granted', 'denied', 'decided', 'decision_seconds')
+
+    def __init__(self, day: int, submitted: int, granted: int, denied: int, decided: int, decision_seconds: int):
+        self.day: int = day
+        self.submitted: int = submitted
+        self.granted: int = granted
+        self.denied: int = denied
+        self.decided: int = decided
+        self.decision_seconds: int = decision_seconds
+
+
+class SubredditStatisticsRecord:
+    """Row of the subreddit_statistics rollup, state is None until the state of the subreddit was first recorded"""
+    __slots__ = ('subreddit', 'request_count', 'granted', 'denied', 'state_value', 'state_changed_at')
+
+    def __init__(self, subreddit: str, request_count: int, granted: int, denied: int, state_value: Optional[int],
+                 state_changed_at: Optional[int]):
+        self.subreddit: str = subreddit
+        self.request_count: int = request_count
+        self.granted: int = granted
+        self.denied: int = denied
+        self.state_value: Optional[int] = state_value
+        self.state_changed_at: Optional[int] = state_changed_at
+
+    @property
+    def state(self) -> Optional[SubredditState]:
+        return None if self.state_value is None else SubredditState(self.state_value)
@@ -1,12 +1,14 @@
+import asyncio
+import sqlite3
 from typing import List, Optional
 from datetime import datetime, timedelta
 
-import aiostream.stream
 import discord.ext.commands
 from discord_components import Button, ButtonStyle, ComponentsBot, Interaction
 
 from database import Database
 from models import Config, SubredditState, SubmissionState
+from reddit_client import RedditClient, RedditUnavailable
 from utilities import get_subreddit_state, get_submission_state, get_subreddit_moderators, \
     get_subreddit_name, get_embed_color
 from time import time, gmtime, strftime
@@ -16,36 +18,43 @@ from discord.ext import tasks, commands
 from discord.ext.commands import Bot
 from discord.abc import Messageable
 
-from asyncpraw import Reddit
 from asyncpraw.models import Subreddit
 from asyncpraw.reddit import Submission, Redditor
 
 from colorama import Fore, Style
 
-glob_reddit: Reddit
+glob_reddit: RedditClient
 glob_bot: ComponentsBot
 
+# How long the first revisit batch waits for the initial backfill of new posts [seconds]
+FIRST_SCRAPE_TIMEOUT = 15 * 60
+
 
 class RedditCog(commands.Cog, name='RedditCog'):
-    def __init__(self, bot: ComponentsBot, reddit: Reddit, database: Database, config: Config):
+    def __init__(self, bot: ComponentsBot, reddit: RedditClient, database: Database, config: Config):
 
         global glob_bot, glob_reddit
         glob_bot = bot
         glob_reddit = reddit
 
         self.bot: Bot = bot
-        self.reddit: Reddit = reddit
+        self.reddit: RedditClient = reddit
         self.database: Database = database
         self.config: Config = config
 
         self.first_run = True
+        # Set once the initial backfill of new posts is done, the first revisit batch waits for it
+        self.first_scrape_done = asyncio.Event()
+        self.maintenance_pending = False
 
         self.find_posts.start()
         self.update_posts.start()
+        self.maintain_database.start()
 
     def cog_unload(self):
         self.find_posts.cancel()
         self.update_posts.cancel()
+        self.maintain_database.cancel()
 
     @tasks.loop(minutes=5)
     async def find_posts(self):
@@ -56,12 +65,17 @@ class RedditCog(commands.Cog, name='RedditCog'):
         post_limit: int = 250 if self.first_run else 50
         self.first_run = False
 
-        # Get supreddit and load in
+        # Get supreddit and new submissions, listings are fetched in pages of 100 submissions
         redditrequest: Subreddit = await self.reddit.subreddit('redditrequest')
-        await redditrequest.load()
-
-        # Get new submissions, reverse order and iterate through them
-        new_submissions: List[Submission] = await aiostream.stream.list(redditrequest.new(limit=post_limit))
+        try:
+            new_submissions: List[Submission] = await self.reddit.collect(lambda: redditrequest.new(limit=post_limit),
+                                                                          cost=-(-post_limit // 100))
+        except RedditUnavailable as exception:
+            print(f'{Fore.BLUE}> Skipped scraping new posts: {exception}  {Style.RESET_ALL}')
+            self.first_scrape_done.set()
+            return
+
+        # Reverse order and iterate through them
         submission: Submission
         for submission in reversed(new_submissions):
 
@@ -69,17 +83,27 @@ class RedditCog(commands.Cog, name='RedditCog'):
             if self.database.is_already_submitted(submission.id):
                 continue
 
-            # Load in submission
-            await submission.load()
-            submission_state = await get_submission_state(submission)
+            try:
+                # Load in submission
+                await self.reddit.load(submission)
+                submission_state = await get_submission_state(self.reddit, submission)
+
+                # Parse the subreddit name from url provided in post, get the submission author and the subreddit
+                subreddit_name: str = get_subreddit_name(submission.url)
+                author: Redditor = submission.author
+                if author is not None:
+                    await self.reddit.load(author)
+                subreddit: Subreddit = await self.reddit.subreddit(subreddit_name)
+                subreddit_state = await get_subreddit_state(self.reddit, subreddit)
+
+                # Build embed
+                embed = await self.build_embed(submission, author, subreddit, subreddit_name, subreddit_state)
+            except RedditUnavailable as exception:
+                # The post is not stored yet, so it is picked up again by the next run
+                print(f'{Fore.BLUE}    Skipped {submission.id}: {exception}  {Style.RESET_ALL}')
+                continue
 
-            # Parse the subreddit name from url provided in post, get the submission author and the subreddit object
-            subreddit_name: str = get_subreddit_name(submission.url)
-            author: Redditor = submission.author
-            if author is not None:
-                await author.load()
-            subreddit: Subreddit = await self.reddit.subreddit(subreddit_name)
-            subreddit_state = await get_subreddit_state(subreddit)
+            self.record_subreddit_state(subreddit_name, subreddit_state)
 
             # Update CLI
             print(f'{Fore.BLUE}    '
@@ -87,9 +111,6 @@ class RedditCog(commands.Cog, name='RedditCog'):
                   f'State: {subreddit_state.name}  '
                   f'{Style.RESET_ALL}')
 
-            # Build embed, send message, store in database
-            embed = await self.build_embed(submission, author, subreddit, subreddit_name, subreddit_state)
-
             # Announce new post in all channels
             for channel in channels:
                 # Send message with embeds and add components to it
@@ -115,12 +136,18 @@ class RedditCog(commands.Cog, name='RedditCog'):
         stop_time = time()
         print(
             f'{Fore.BLUE}> Finished scraping new posts. Took: {strftime("%H:%M:%S", gmtime(stop_time - start_time))}  {Style.RESET_ALL}')
+        self.first_scrape_done.set()
 
     @find_posts.before_loop
     async def before_scrape_scoreboard(self) -> None:
         print(f'{Fore.BLUE}> Preparing to scrape new posts  {Style.RESET_ALL}')
         await self.bot.wait_until_ready()
 
+    @find_posts.after_loop
+    async def after_scrape_scoreboard(self) -> None:
+        # Don't keep revisiting on hold if scraping stopped before its first run finished
+        self.first_scrape_done.set()
+
     @tasks.loop(hours=2)
     async def update_posts(self):
         start_time = time()
@@ -140,30 +167,36 @@ class RedditCog(commands.Cog, name='RedditCog'):
               f'Revisiting: {Fore.RED}{estimated_posts}{Fore.GREEN} posts with this batch  '
               f'{Style.RESET_ALL}')
 
-        for data in self.database.get_update_submissions(min_age, max_age):
-            submission_id: str = data["submission_id"]
-            submission = await reddit.submission(id=submission_id)
-
-            # TODO Rewrite to use database and utilities
-            # get subreddit name, subreddit, subreddit state, submission, author and build embed
-            subreddit_name = get_subreddit_name(submission.url)
-            subreddit = await reddit.subreddit(subreddit_name)
-            subreddit_state = await get_subreddit_state(subreddit)
-            author = submission.author
-            if not author is None:
-                await author.load()
-
-            # Update embed in Discord message
-            embed = await self.build_embed(submission,
-                                           submission.author,
-                                           subreddit,
-                                           subreddit_name,
-                                           subreddit_state)
-
-            # Prepare database update
-            timestamp: int = int(datetime.now().timestamp())
-            submission_state: SubmissionState = await get_submission_state(submission)
-            submission_id: str = submission_id
+        for record in self.database.get_update_submissions(min_age, max_age):
+            submission_id: str = record.submission_id
+            try:
+                submission = await reddit.submission(submission_id)
+
+                # TODO Rewrite to use database and utilities
+                # get subreddit name, subreddit, subreddit state, submission, author and build embed
+                subreddit_name = get_subreddit_name(submission.url)
+                subreddit = await reddit.subreddit(subreddit_name)
+                subreddit_state = await get_subreddit_state(reddit, subreddit)
+                author = submission.author
+                if not author is None:
+                    await reddit.load(author)
+
+                # Update embed in Discord message
+                embed = await self.build_embed(submission,
+                                               submission.author,
+                                               subreddit,
+                                               subreddit_name,
+                                               subreddit_state)
+
+                # Prepare database update
+                timestamp: int = int(datetime.now().timestamp())
+                submission_state: SubmissionState = await get_submission_state(reddit, submission)
+            except RedditUnavailable as exception:
+                # The post keeps its old update timestamp, so it is revisited again with the next batch
+                print(f'    {Fore.GREEN}Skipped {submission_id}: {exception}  {Style.RESET_ALL}')
+                continue
+
+            self.record_subreddit_state(subreddit_name, subreddit_state)
 
             # Update on CLI
             print(f'    {Fore.RED}{updated_posts}{Fore.GREEN}/'
@@ -173,11 +206,11 @@ class RedditCog(commands.Cog, name='RedditCog'):
                   f'{Style.RESET_ALL}')
 
             # Update messages in database
-            for channel_id, message_id in self.database.get_message_ids(submission_id):
-                channel: TextChannel = self.bot.get_channel(channel_id)
+            for message_record in self.database.get_message_records(submission_id):
+                channel: TextChannel = self.bot.get_channel(message_record.channel_id)
                 if channel is None:
                     continue
-                message: Message = await channel.fetch_message(message_id)
+                message: Message = await channel.fetch_message(message_record.message_id)
                 await message.remove_reaction('🆕', self.bot.user)
                 await message.add_reaction('🔄')
                 await message.edit(embed=embed)
@@ -187,7 +220,7 @@ class RedditCog(commands.Cog, name='RedditCog'):
                 await message.remove_reaction('🔄', self.bot.user)
             updated_posts += 1
             self.database.update_message(submission_id, timestamp)
-            self.database.update_post(submission_id, timestamp, submission_state)
+            self.database.update_post(submission_id, timestamp, submission_state, int(submission.created_utc))
 
         stop_time = time()
         print(f'{Fore.GREEN}> '
@@ -201,6 +234,51 @@ class RedditCog(commands.Cog, name='RedditCog'):
         print(f'{Fore.GREEN}> Getting ready to validate previous posts {Style.RESET_ALL}')
         await self.bot.wait_until_ready()
 
+        # Announcing new posts comes first, the first revisit batch waits for the initial backfill to finish
+        try:
+            await asyncio.wait_for(self.first_scrape_done.wait(), FIRST_SCRAPE_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f'{Fore.GREEN}> Initial scrape still running, revisiting anyway {Style.RESET_ALL}')
+
+    @tasks.loop(hours=1)
+    async def maintain_database(self):
+        # Only run during the configured off-peak hour, or right after a run which could not finish
+        if datetime.now().hour != self.config.maintenance_hour and not self.maintenance_pending:
+            return
+
+        start_time = time()
+        self.maintenance_pending = False
+
+        try:
+            # Never archive posts which are still being revisited
+            retention_days = max(self.config.retention_days, self.config.max_post_age)
+            horizon: int = int((datetime.now() - timedelta(days=retention_days)).timestamp())
+            archived_posts = self.database.archive_submissions(horizon)
+
+            # Remove messages of channels which were deleted or the bot can no longer access, unless a guild is
+            # temporarily unavailable and its channels just can't be resolved right now
+            pruned_messages = 0
+            if not any(guild.unavailable for guild in self.bot.guilds):
+                deleted_channels = [channel_id for channel_id in self.database.get_message_channel_ids()
+                                    if self.bot.get_channel(channel_id) is None]
+                pruned_messages = self.database.delete_channel_messages(deleted_channels)
+
+            self.database.vacuum(self.config.vacuum_pages)
+        except sqlite3.OperationalError as exception:
+            self.maintenance_pending = True
+            print(f'{Fore.YELLOW}> Database maintenance failed, retrying in an hour: {exception}  {Style.RESET_ALL}')
+            return
+
+        stop_time = time()
+        print(f'{Fore.YELLOW}> '
+              f'Database maintenance: archived {archived_posts} posts, pruned {pruned_messages} messages. Took: '
+              f'{strftime("%H:%M:%S", gmtime(stop_time - start_time))}  '
+              f'{Style.RESET_ALL}')
+
+    @maintain_database.before_loop
+    async def before_maintain_database(self) -> None:
+        await self.bot.wait_until_ready()
+
     @commands.cooldown(1, 30, commands.BucketType.guild)
     @commands.command(name="statistics")
     async def request_statistics(self, ctx, timeframe: int = 24):
@@ -239,6 +317,84 @@ class RedditCog(commands.Cog, name='RedditCog'):
 
         await ctx.send(embed=embed)
 
+    @commands.cooldown(1, 30, commands.BucketType.guild)
+    @commands.command(name="trends")
+    async def request_trends(self, ctx, days: int = 7):
+        embed: Embed = Embed(color=Color.from_rgb(0, 187, 255))
+        embed.title = "Trends"
+
+        # Keep the daily breakdown within the size limit of an embed field
+        days = min(max(days, 1), 14)
+        now = datetime.now()
+        since: int = int((now - timedelta(days=days - 1)).timestamp())
+        daily_statistics = self.database.get_daily_statistics(since)
+
+        lines: List[str] = []
+        for day in daily_statistics:
+            decisions = day.granted + day.denied
+            approval_rate = f'{round(day.granted / decisions * 100, 2)}%' if decisions > 0 else '-'
+            lines.append(f'`{datetime.utcfromtimestamp(day.day).strftime("%Y-%m-%d")}` '
+                         f'{day.submitted} posts, {day.granted} granted, {day.denied} denied, approval {approval_rate}')
+
+        submitted = sum(day.submitted for day in daily_statistics)
+        granted = sum(day.granted for day in daily_statistics)
+        denied = sum(day.denied for day in daily_statistics)
+        decided = sum(day.decided for day in daily_statistics)
+        decision_seconds = sum(day.decision_seconds for day in daily_statistics)
+
+        embed.add_field(name='Timeframe', value=f'{days}d', inline=True)
+        embed.add_field(name='Posts', value=f'{submitted}', inline=True)
+        embed.add_field(name='Approval-rate',
+                        value=f'{round(granted / (granted + denied) * 100, 2)}%' if granted + denied > 0 else '-',
+                        inline=True)
+        embed.add_field(name='Average time to decision',
+                        value=str(timedelta(seconds=decision_seconds // decided)) if decided > 0 else '-',
+                        inline=True)
+        embed.add_field(name='Per day', value='\n'.join(lines) if len(lines) > 0 else 'No data', inline=False)
+
+        most_requested = [f'r/{subreddit.subreddit}: {subreddit.request_count}'
+                          for subreddit in self.database.get_most_requested_subreddits(5)]
+        embed.add_field(name='Most requested subreddits',
+                        value='\n'.join(most_requested) if len(most_requested) > 0 else 'No data',
+                        inline=False)
+
+        embed.timestamp = now
+        await ctx.send(embed=embed)
+
+    @commands.cooldown(1, 10, commands.BucketType.guild)
+    @commands.command(name="subreddit")
+    async def subreddit_history(self, ctx, name: str):
+        subreddit_name = name[2:] if name.lower().startswith('r/') else name
+        statistics = self.database.get_subreddit_statistics(subreddit_name)
+        if statistics is None:
+            await ctx.send(f'r/{subreddit_name} has not been requested yet')
+            return
+
+        embed: Embed = Embed(title=f'r/{statistics.subreddit}', color=Color.from_rgb(0, 187, 255))
+        embed.url = f'https://www.reddit.com/r/{statistics.subreddit}/'
+        embed.add_field(name='Requests', value=f'{statistics.request_count}', inline=True)
+        embed.add_field(name='Granted', value=f'{statistics.granted}', inline=True)
+        embed.add_field(name='Denied', value=f'{statistics.denied}', inline=True)
+        embed.add_field(name='Subreddit state',
+                        value='-' if statistics.state is None else statistics.state.name,
+                        inline=True)
+
+        history: List[str] = []
+        for from_state, to_state, occurred_at in self.database.get_subreddit_events(statistics.subreddit, 10):
+            change = to_state.name if from_state is None else f'{from_state.name} → {to_state.name}'
+            history.append(f'`{datetime.utcfromtimestamp(occurred_at).strftime("%Y-%m-%d %H:%M")}` {change}')
+        if len(history) > 0:
+            embed.add_field(name='State history', value='\n'.join(history), inline=False)
+
+        embed.timestamp = datetime.now()
+        await ctx.send(embed=embed)
+
+    def record_subreddit_state(self, subreddit_name: str, subreddit_state: SubredditState) -> None:
+        # NOT_REACHABLE says nothing about the subreddit itself, recording it would clutter the state history
+        if subreddit_state is SubredditState.NOT_REACHABLE:
+            return
+        self.database.update_subreddit_state(subreddit_name, subreddit_state, int(datetime.now().timestamp()))
+
     def get_all_channels(self) -> List[TextChannel]:
         channels: List[TextChannel] = []
         guild: Guild
@@ -255,7 +411,7 @@ class RedditCog(commands.Cog, name='RedditCog'):
                           subreddit_name: str,
                           subreddit_state: SubredditState) -> Embed:
         state = subreddit_state
-        submission_state = await get_submission_state(submission)
+        submission_state = await get_submission_state(self.reddit, submission)
 
         embed = Embed(title=f'r/{subreddit_name}', color=get_embed_color(submission_state))
         if author is None:
@@ -279,13 +435,13 @@ class RedditCog(commands.Cog, name='RedditCog'):
         embed.add_field(name='Request state', value=submission_state.name, inline=True)
 
         if state == SubredditState.PUBLIC or state == SubredditState.RESTRICTED:
-            await subreddit.load()
+            await self.reddit.load(subreddit)
             if subreddit.community_icon is not None:
                 embed.set_thumbnail(url=subreddit.community_icon)
             embed.add_field(name='NSFW', value=subreddit.over18, inline=True)
             embed.add_field(name='Members', value=subreddit.subscribers, inline=True)
 
-            moderators = await get_subreddit_moderators(subreddit)
+            moderators = await get_subreddit_moderators(self.reddit, subreddit)
 
             embed.add_field(name='Moderators', value=str(len(moderators)), inline=True)
             if not len(moderators) == 0:
@@ -319,19 +475,26 @@ async def send_detailed_report(interaction: Interaction):
 
     title_embed: Embed = message.embeds[0]
     embeds: List[Embed] = [title_embed]
-    embeds += await build_detailed_report_embeds(glob_bot, glob_reddit, title_embed)
+    try:
+        # Reports are requested by users, so they are served from the interactive request reserve
+        with glob_reddit.interactive():
+            embeds += await build_detailed_report_embeds(glob_bot, glob_reddit, title_embed)
+    except RedditUnavailable as exception:
+        print(f'{Fore.BLUE}    Failed to build detailed report: {exception}  {Style.RESET_ALL}')
+        return
     await message.edit(embeds=embeds)
 
 
-async def build_detailed_report_embeds(bot: ComponentsBot, reddit: Reddit, title_embed: Embed) -> List[Embed]:
+async def build_detailed_report_embeds(bot: ComponentsBot, reddit: RedditClient, title_embed: Embed) -> List[Embed]:
     embeds: List[Embed] = list()
     submission: Submission = await reddit.submission(url=title_embed.url)
-    await submission.load()
+    await reddit.load(submission)
 
     embed: Embed = Embed(title="Report for requester", color=title_embed.color)
     author = submission.author
-    await author.load()
-    embed.url = f'https://www.reddit.com/user/{author.name}'
+    if author is not None:
+        await reddit.load(author)
+        embed.url = f'https://www.reddit.com/user/{author.name}'
     if author is None or hasattr(author, 'is_suspended'):
         embed.description = "Account was deleted or suspended"
     else:
@@ -363,11 +526,12 @@ async def build_detailed_report_embeds(bot: ComponentsBot, reddit: Reddit, title
     embed: Embed = Embed(title="Report for requested subreddit", color=title_embed.color)
     subreddit_name = get_subreddit_name(submission.url)
     subreddit = await reddit.subreddit(subreddit_name)
-    subreddit_state: SubredditState = await get_subreddit_state(subreddit)
+    subreddit_state: SubredditState = await get_subreddit_state(reddit, subreddit)
     if subreddit_state not in [SubredditState.PUBLIC, SubredditState.RESTRICTED]:
         embed.description = f'Subreddit is *{subreddit_state.name}*, can\'t load further data'
     else:
-        embed.description = f'Subreddit {subreddit.display_name_prefixed} currently has {len(subreddit.moderator)} moderators'
+        moderators = await get_subreddit_moderators(reddit, subreddit)
+        embed.description = f'Subreddit {subreddit.display_name_prefixed} currently has {len(moderators)} moderators'
 
     embeds.append(embed)
 
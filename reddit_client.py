@@ -0,0 +1,151 @@
+import asyncio
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import monotonic
+from typing import AsyncIterable, Awaitable, Callable, List, Optional, TypeVar
+
+from asyncpraw import Reddit
+from asyncpraw.models import Subreddit
+from asyncpraw.reddit import Submission
+from asyncprawcore import RequestException, ResponseException
+from colorama import Fore, Style
+
+from models import Config, RequestPriority
+
+T = TypeVar('T')
+
+_priority: ContextVar[RequestPriority] = ContextVar('reddit_request_priority', default=RequestPriority.BACKGROUND)
+
+
+class RedditUnavailable(Exception):
+    """Raised when a request kept failing with transient errors until all retries were used up"""
+
+
+def is_transient_error(exception: Exception) -> bool:
+    """Transient errors are network failures, server errors and rate limiting, anything else won't go away by retrying"""
+    if isinstance(exception, (RequestException, asyncio.TimeoutError)):
+        return True
+    if isinstance(exception, ResponseException):
+        status = exception.response.status
+        return status == 429 or status >= 500
+    return False
+
+
+def get_retry_after(exception: Exception) -> float:
+    """Returns how many seconds Reddit asked to wait before retrying, 0 if the response doesn't say"""
+    response = getattr(exception, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers is None:
+        return 0
+    for header in ('retry-after', 'x-ratelimit-reset'):
+        try:
+            return max(float(headers[header]), 0)
+        except (KeyError, TypeError, ValueError):
+            continue
+    return 0
+
+
+class TokenBucket:
+    """
+    Token bucket limiting the request rate, a reserve of tokens can only be taken by interactive requests so they don't
+    have to wait for background batches.
+    """
+
+    def __init__(self, requests_per_minute: int, reserve: int):
+        self.rate: float = requests_per_minute / 60
+        self.reserve: int = reserve
+        # Allow a burst of ten seconds worth of requests on top of the reserve
+        self.capacity: float = reserve + max(self.rate * 10, 1)
+        self.tokens: float = self.capacity
+        self.updated_at: float = monotonic()
+
+    def __refill(self) -> None:
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, cost: int, priority: RequestPriority) -> None:
+        floor = 0 if priority is RequestPriority.INTERACTIVE else self.reserve
+        cost = min(cost, self.capacity - floor)
+        while True:
+            self.__refill()
+            if self.tokens - cost >= floor:
+                self.tokens -= cost
+                return
+            await asyncio.sleep((floor + cost - self.tokens) / self.rate)
+
+
+class RedditClient:
+    """
+    Wrapper every Reddit request goes through. Requests share one token bucket, transient errors are retried with
+    jittered exponential backoff and permanent errors are raised right away.
+
+    Requests are made with background priority, unless they are made within interactive().
+    """
+
+    def __init__(self, reddit: Reddit, config: Config):
+        self.reddit: Reddit = reddit
+        self.max_retries: int = config.reddit_max_retries
+        self.base_backoff: float = 1
+        self.max_backoff: float = 60
+        self.bucket: TokenBucket = TokenBucket(config.reddit_requests_per_minute, config.reddit_interactive_reserve)
+
+    @contextmanager
+    def interactive(self):
+        """Makes all requests within this context, including those of tasks started from it, interactive"""
+        token = _priority.set(RequestPriority.INTERACTIVE)
+        try:
+            yield
+        finally:
+            _priority.reset(token)
+
+    async def request(self, request: Callable[[], Awaitable[T]], cost: int = 1) -> T:
+        """Runs a request within the request budget, cost is the number of API calls the request makes"""
+        priority = _priority.get()
+        attempt = 0
+        while True:
+            await self.bucket.acquire(cost, priority)
+            try:
+                return await request()
+            except Exception as exception:
+                if not is_transient_error(exception):
+                    raise
+                if attempt >= self.max_retries:
+                    raise RedditUnavailable(f'Reddit request failed after {attempt + 1} attempts') from exception
+
+                # Rate limited responses tell how long to wait, that is the least the backoff has to wait
+                delay = max(random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt)),
+                            get_retry_after(exception))
+                attempt += 1
+                print(f'{Fore.MAGENTA}    Reddit request failed ({type(exception).__name__}), '
+                      f'retry {attempt}/{self.max_retries} in {delay:.1f}s  {Style.RESET_ALL}')
+                await asyncio.sleep(delay)
+
+    async def collect(self, iterable: Callable[[], AsyncIterable[T]], cost: int = 1) -> List[T]:
+        """Collects a listing into a list, the whole listing is fetched again if it has to be retried"""
+        async def consume() -> List[T]:
+            return [item async for item in iterable()]
+        return await self.request(consume, cost)
+
+    async def load(self, reddit_object) -> None:
+        # Objects asyncpraw fetched already don't make a request, so they are not charged to the budget
+        if getattr(reddit_object, '_fetched', False):
+            return
+        await self.request(reddit_object.load)
+
+    async def comments(self, submission: Submission):
+        """Returns the comment forest of a submission, it is only requested if the submission wasn't fetched yet"""
+        if getattr(submission, '_fetched', False):
+            return await submission.comments()
+        return await self.request(submission.comments)
+
+    async def subreddit(self, name: str) -> Subreddit:
+        """Returns a lazy subreddit, it is fetched with load()"""
+        return await self.reddit.subreddit(name)
+
+    async def submission(self, submission_id: Optional[str] = None, url: Optional[str] = None) -> Submission:
+        return await self.request(lambda: self.reddit.submission(id=submission_id, url=url))
+
+    async def close(self) -> None:
+        await self.reddit.close()
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime
+from types import SimpleNamespace
+
+from database import Database
+from models import SubmissionState
+
+
+def make_submission(submission_id: str, posted_at: int) -> SimpleNamespace:
+    return SimpleNamespace(id=submission_id, author=None, created_utc=posted_at)
+
+
+class RollupTest(unittest.TestCase):
+    def setUp(self):
+        self.database = Database(':memory:')
+        self.now = int(datetime.now().timestamp())
+        self.posted_at = self.now - 600
+
+    def tearDown(self):
+        self.database.close()
+
+    def put_submission(self, submission_id: str, subreddit: str, state: SubmissionState) -> None:
+        asyncio.run(self.database.put_submission(make_submission(submission_id, self.posted_at), subreddit, state))
+
+    def daily_totals(self):
+        """Sums up all days, so the tests don't depend on which day the changes end up on"""
+        cursor = self.database.connection.cursor()
+        cursor.execute('SELECT SUM(submitted), SUM(granted), SUM(denied), SUM(decided), SUM(decision_seconds) '
+                       'FROM daily_statistics')
+        return cursor.fetchone()
+
+    def subreddit_totals(self, subreddit: str):
+        statistics = self.database.get_subreddit_statistics(subreddit)
+        return statistics.request_count, statistics.granted, statistics.denied
+
+    def test_first_decision(self):
+        self.put_submission('a', 'Foo', SubmissionState.NOT_ASSESSED)
+        self.database.update_post('a', self.now + 3600, SubmissionState.DENIED, self.posted_at)
+
+        self.assertEqual(self.daily_totals(), (1, 0, 1, 1, self.now + 3600 - self.posted_at))
+        self.assertEqual(self.subreddit_totals('Foo'), (1, 0, 1))
+
+    def test_revised_decision(self):
+        self.put_submission('a', 'Foo', SubmissionState.NOT_ASSESSED)
+        self.put_submission('b', 'Foo', SubmissionState.NOT_ASSESSED)
+        for offset, state in enumerate((SubmissionState.DENIED,
+                                        SubmissionState.FOLLOWUP,
+                                        SubmissionState.DENIED,
+                                        SubmissionState.GRANTED), start=1):
+            self.database.update_post('a', self.now + offset * 3600, state, self.posted_at)
+
+        self.assertEqual(self.daily_totals(), (2, 1, 0, 1, self.now + 3600 - self.posted_at))
+        self.assertEqual(self.subreddit_totals('Foo'), (2, 1, 0))
+
+    def test_decided_when_stored(self):
+        self.put_submission('a', 'Foo', SubmissionState.GRANTED)
+
+        self.assertEqual(self.daily_totals(), (1, 1, 0, 0, 0))
+        self.assertEqual(self.subreddit_totals('Foo'), (1, 1, 0))
+
+    def test_unchanged_status(self):
+        self.put_submission('a', 'Foo', SubmissionState.NOT_ASSESSED)
+        self.database.update_post('a', self.now + 3600, SubmissionState.NOT_ASSESSED, self.posted_at)
+
+        cursor = self.database.connection.cursor()
+        cursor.execute('SELECT COUNT(*) FROM submission_events')
+        self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertEqual(self.daily_totals(), (1, 0, 0, 0, 0))
+
+    def test_subreddit_names_are_case_insensitive(self):
+        self.put_submission('a', 'Foo', SubmissionState.NOT_ASSESSED)
+        self.put_submission('b', 'foo', SubmissionState.DENIED)
+
+        self.assertEqual(self.subreddit_totals('FOO'), (2, 0, 1))
+        self.assertEqual(len(self.database.get_most_requested_subreddits(5)), 1)
+
+    def test_archive_keeps_rollups(self):
+        self.put_submission('a', 'Foo', SubmissionState.NOT_ASSESSED)
+        self.database.update_post('a', self.now + 3600, SubmissionState.GRANTED, self.posted_at)
+        totals = self.daily_totals()
+
+        self.assertEqual(self.database.archive_submissions(self.now + 86400), 1)
+
+        cursor = self.database.connection.cursor()
+        cursor.execute('SELECT COUNT(*) FROM submission_events')
+        self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertEqual(self.daily_totals(), totals)
+        self.assertEqual(self.subreddit_totals('Foo'), (1, 1, 0))
+        self.assertEqual(self.database.get_post_count_with_status(self.now - 86400, SubmissionState.GRANTED), 1)
+
+
+class BackfillTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.database_path = os.path.join(self.directory.name, 'backfill.sqlite')
+        self.created_at = int(datetime.now().timestamp()) - 5 * 86400
+
+        # A database from before the rollups existed
+        connection = sqlite3.connect(self.database_path)
+        connection.execute('CREATE TABLE submissions(id INTEGER PRIMARY KEY AUTOINCREMENT, submission_id TEXT UNIQUE, '
+                           'subreddit TEXT, created_at INTEGER, updated_at INTEGER, status INTEGER DEFAULT 0)')
+        connection.executemany('INSERT INTO submissions(submission_id, subreddit, created_at, updated_at, status) '
+                               'VALUES (?, ?, ?, ?, ?)',
+                               [('a', 'Foo', self.created_at, self.created_at, SubmissionState.DENIED.value),
+                                ('b', 'foo', self.created_at, self.created_at, SubmissionState.NOT_ASSESSED.value)])
+        connection.commit()
+        connection.close()
+
+        self.database = Database(self.database_path)
+
+    def tearDown(self):
+        self.database.close()
+        self.directory.cleanup()
+
+    def test_backfill(self):
+        day = self.created_at - self.created_at % 86400
+        daily = self.database.get_daily_statistics(day)
+        self.assertEqual([(row.day, row.submitted, row.granted, row.denied, row.decided, row.decision_seconds)
+                          for row in daily],
+                         [(day, 2, 0, 1, 0, 0)])
+        statistics = self.database.get_subreddit_statistics('FOO')
+        self.assertEqual((statistics.request_count, statistics.granted, statistics.denied), (2, 0, 1))
+
+    def test_revised_backfilled_decision(self):
+        now = int(datetime.now().timestamp())
+        self.database.update_post('a', now, SubmissionState.GRANTED, self.created_at)
+
+        # The backfilled denial is taken back from the day it was counted on
+        day = self.created_at - self.created_at % 86400
+        self.assertEqual(self.database.get_daily_statistics(day)[0].denied, 0)
+        self.assertEqual(sum(row.granted for row in self.database.get_daily_statistics(day)), 1)
+        self.assertEqual(sum(row.decided for row in self.database.get_daily_statistics(day)), 0)
+        statistics = self.database.get_subreddit_statistics('Foo')
+        self.assertEqual((statistics.request_count, statistics.granted, statistics.denied), (2, 1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,6 +5,7 @@ from asyncprawcore import Forbidden, NotFound, BadRequest
 from discord import Color
 
 from models import SubredditState, SubmissionState
+from reddit_client import RedditClient, RedditUnavailable
 
 
 def get_subreddit_name(url: str) -> str:
@@ -20,9 +21,9 @@ def get_subreddit_name(url: str) -> str:
     return url
 
 
-async def get_subreddit_state(subreddit: Subreddit) -> SubredditState:
+async def get_subreddit_state(reddit: RedditClient, subreddit: Subreddit) -> SubredditState:
     try:
-        await subreddit.load()
+        await reddit.load(subreddit)
         if subreddit.subreddit_type == "public":
             return SubredditState.PUBLIC
         elif subreddit.subreddit_type == "restricted":
@@ -33,13 +34,15 @@ async def get_subreddit_state(subreddit: Subreddit) -> SubredditState:
         return SubredditState.BANNED
     except BadRequest:
         return SubredditState.BAD_URL
+    except RedditUnavailable:
+        return SubredditState.NOT_REACHABLE
     return SubredditState.NOT_REACHABLE
 
 
-async def get_submission_state(submission: Submission) -> SubmissionState:
-    comments = await submission.comments()
+async def get_submission_state(reddit: RedditClient, submission: Submission) -> SubmissionState:
+    comments = await reddit.comments(submission)
     async for tlc in comments:
-        await tlc.load()
+        await reddit.load(tlc)
         if tlc.author_flair_text is not None and "admin" in tlc.author_flair_text:
             tlc_body: str = tlc.body
             comment = tlc_body.lower()
@@ -72,8 +75,6 @@ def get_embed_color(submission_state: SubmissionState) -> Color:
     return Color.purple()
 
 
-async def get_subreddit_moderators(subreddit: Subreddit) -> List[str]:
-    moderators: List[str] = []
-    async for mod in subreddit.moderator:
-        moderators.append(f'u/{mod.name}')
-    return moderators
+async def get_subreddit_moderators(reddit: RedditClient, subreddit: Subreddit) -> List[str]:
+    moderators = await reddit.collect(lambda: subreddit.moderator)
+    return [f'u/{mod.name}' for mod in moderators]